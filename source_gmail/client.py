@@ -3,16 +3,133 @@
 #
 
 import base64
-from typing import Any, Dict, List, Optional
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
+import google_auth_httplib2
+import httplib2
+import orjson
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 
 from airbyte_cdk import AirbyteTracedException, FailureType
 from source_gmail.spec import SourceGmailSpec
 
+logger = logging.getLogger("airbyte")
+
+# Number of calls sent in a single Gmail batch request. Google allows up to 100 but
+# advises against more than 50, since larger batches are more likely to be throttled.
+BATCH_SIZE = 50
+
+# Maximum number of message ids returned per list page
+PAGE_SIZE = 500
+
+# Headers requested when fetching messages in metadata format
+METADATA_HEADERS = ["From", "To", "Cc", "Bcc", "Subject", "Date"]
+
+# Partial response masks per message format, so the server only sends the fields we read
+MESSAGE_FIELDS = {
+    'full': 'id,threadId,labelIds,snippet,internalDate,sizeEstimate,historyId,payload',
+    'metadata': 'id,threadId,labelIds,snippet,internalDate,sizeEstimate,historyId,payload/headers',
+}
+
+# Socket timeout in seconds for Gmail API connections
+HTTP_TIMEOUT = 60
+
+# How long before expiry the access token is refreshed in the background
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+# Gmail statuses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Gmail usually reports throttling as a 403 with one of these reasons, not as a 429
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+# Attempts, and the cap in seconds on the jittered exponential wait, for retryable batch failures
+MAX_RETRY_ATTEMPTS = 5
+MAX_RETRY_WAIT = 60
+
+# Number of batch requests the messages stream runs concurrently. Throughput is paced
+# separately by the quota limiter below.
+MAX_CONCURRENT_BATCHES = 4
+
+# Gmail's per-user quota, in quota units per second, and the cost of one messages.get call
+QUOTA_UNITS_PER_SECOND = 250
+MESSAGE_GET_QUOTA_UNITS = 5
+
+
+class RetryableBatchError(Exception):
+    """
+    Raised when part of a batch request failed with a retryable status.
+    """
+
+
+class QuotaRateLimiter:
+    """
+    Token bucket that paces requests to a budget of quota units per second.
+    """
+
+    def __init__(self, units_per_second: float):
+        self._rate = units_per_second
+        # Allow at most one second's worth of units in a burst
+        self._capacity = units_per_second
+        self._tokens = units_per_second
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, units: float) -> None:
+        """Block until `units` quota units can be spent."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            # Spend the units up front, going into debt if needed, so concurrent
+            # callers queue up behind each other instead of all waking at once
+            self._tokens -= units
+            delay = -self._tokens / self._rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+class OrjsonModel(JsonModel):
+    """
+    JSON model that decodes API responses, including batch parts, with orjson.
+    """
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Fall back to the stock handling for non-JSON payloads
+            return super().deserialize(content)
+        if self._data_wrapper and isinstance(body, dict) and "data" in body:
+            body = body["data"]
+        return body
+
+
+def _is_retryable(error: HttpError) -> bool:
+    """Whether an error is throttling or a transient server failure worth retrying."""
+    # A BatchError is an HttpError whose resp may be None
+    status = getattr(error.resp, 'status', None)
+    if status in RETRYABLE_STATUSES:
+        return True
+    if status == 403:
+        details = getattr(error, 'error_details', None)
+        if isinstance(details, list) and any(
+            isinstance(detail, dict) and detail.get('reason') in RATE_LIMIT_REASONS for detail in details
+        ):
+            return True
+        return 'rate limit exceeded' in (error.reason or '').lower()
+    return False
+
 
 class GmailClient:
     """
@@ -23,6 +140,38 @@ class GmailClient:
         self.config = config
         self._service = None
         self._credentials = None
+        self._profile = None
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self._refresh_future: Optional[Future] = None
+        self._refresh_executor = ThreadPoolExecutor(max_workers=1)
+        # Shared by every batch so concurrent batches stay within the per-user quota together
+        self._quota = QuotaRateLimiter(QUOTA_UNITS_PER_SECOND)
+        # The config is fixed for the sync, so its query filters are built once
+        self._base_query_suffix = self._build_base_query_suffix()
+
+    def _build_base_query_suffix(self) -> str:
+        """Build the Gmail query filters derived from the config."""
+        query_parts = []
+        
+        # Add spam/trash filter
+        if not self.config.include_spam_trash:
+            query_parts.append("-in:spam -in:trash")
+        
+        # Add start date filter if provided
+        if self.config.start_date:
+            # Convert ISO format to Gmail query format (YYYY/MM/DD)
+            # Example: 2024-01-01T00:00:00.000000Z -> after:2024/1/1
+            try:
+                date_part = self.config.start_date.split('T')[0]  # Get YYYY-MM-DD part
+                year, month, day = date_part.split('-')
+                gmail_date = f"{year}/{int(month)}/{int(day)}"  # Remove leading zeros
+                query_parts.append(f"after:{gmail_date}")
+            except ValueError:
+                # If parsing fails, use the date as-is
+                query_parts.append(f"after:{self.config.start_date}")
+        
+        return " ".join(query_parts)
 
     @property
     def credentials(self):
@@ -38,36 +187,67 @@ class GmailClient:
             )
             # Refresh the token
             self._credentials.refresh(Request())
+        else:
+            self._maybe_schedule_refresh()
         return self._credentials
 
+    def _maybe_schedule_refresh(self) -> None:
+        """Refresh the access token in the background when it is close to expiring."""
+        expiry = self._credentials.expiry
+        # google-auth stores expiry as a naive UTC datetime
+        if expiry is None or expiry - datetime.now(timezone.utc).replace(tzinfo=None) > TOKEN_REFRESH_MARGIN:
+            return
+        
+        with self._refresh_lock:
+            # Only one refresh may be in flight at a time
+            if self._refresh_future is None or self._refresh_future.done():
+                self._refresh_future = self._refresh_executor.submit(self._credentials.refresh, Request())
+
     @property
     def service(self):
         """Get Gmail service instance."""
         if not self._service:
-            self._service = build('gmail', 'v1', credentials=self.credentials)
+            self._service = build('gmail', 'v1', http=self.http, cache_discovery=False, model=OrjsonModel())
         return self._service
 
+    @property
+    def http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """Get an authorized HTTP transport for the current thread.
+
+        The transport is reused across calls so its kept-alive connection
+        avoids a new TCP and TLS handshake per request. httplib2 connections
+        are not thread-safe, so every thread issuing requests gets its own.
+        """
+        if not getattr(self._local, 'http', None):
+            self._local.http = google_auth_httplib2.AuthorizedHttp(
+                self.credentials,
+                http=httplib2.Http(cache=None, timeout=HTTP_TIMEOUT)
+            )
+        else:
+            self._maybe_schedule_refresh()
+        return self._local.http
+
+    def get_profile(self) -> Dict[str, Any]:
+        """Get the authenticated user's profile, or an empty dict if it cannot be retrieved."""
+        if not self._profile:
+            try:
+                self._profile = self.service.users().getProfile(userId='me').execute(http=self.http)
+            except Exception:
+                return {}
+        return self._profile
+
     def check_connection(self) -> bool:
         """Check if we can connect to Gmail API."""
-        try:
-            # Try to get user profile
-            self.service.users().getProfile(userId='me').execute()
-            return True
-        except Exception:
-            return False
+        return bool(self.get_profile())
 
     def get_user_email(self) -> str:
         """Get the authenticated user's email address."""
-        try:
-            profile = self.service.users().getProfile(userId='me').execute()
-            return profile.get('emailAddress', 'unknown')
-        except Exception:
-            return 'unknown'
+        return self.get_profile().get('emailAddress', 'unknown')
 
     def get_labels(self) -> List[Dict[str, Any]]:
         """Get all labels from the mailbox."""
         try:
-            results = self.service.users().labels().list(userId='me').execute()
+            results = self.service.users().labels().list(userId='me').execute(http=self.http)
             return results.get('labels', [])
         except HttpError as error:
             raise AirbyteTracedException(
@@ -81,45 +261,21 @@ class GmailClient:
         try:
             kwargs = {
                 'userId': 'me',
-                'maxResults': 100,  # Default batch size
+                'maxResults': PAGE_SIZE,
             }
             
-            if query:
-                kwargs['q'] = query
-            
             if label_ids:
                 kwargs['labelIds'] = label_ids
             
             if page_token:
                 kwargs['pageToken'] = page_token
             
-            # Build query with filters
-            query_parts = []
-            
-            if query:
-                query_parts.append(query)
+            # Combine the caller's query with the static config filters
+            q = f"{query} {self._base_query_suffix}".strip() if query else self._base_query_suffix
+            if q:
+                kwargs['q'] = q
             
-            # Add spam/trash filter
-            if not self.config.include_spam_trash:
-                query_parts.append("-in:spam -in:trash")
-            
-            # Add start date filter if provided
-            if self.config.start_date:
-                # Convert ISO format to Gmail query format (YYYY/MM/DD)
-                # Example: 2024-01-01T00:00:00.000000Z -> after:2024/1/1
-                try:
-                    date_part = self.config.start_date.split('T')[0]  # Get YYYY-MM-DD part
-                    year, month, day = date_part.split('-')
-                    gmail_date = f"{year}/{int(month)}/{int(day)}"  # Remove leading zeros
-                    query_parts.append(f"after:{gmail_date}")
-                except:
-                    # If parsing fails, use the date as-is
-                    query_parts.append(f"after:{self.config.start_date}")
-            
-            if query_parts:
-                kwargs['q'] = " ".join(query_parts)
-            
-            return self.service.users().messages().list(**kwargs).execute()
+            return self.service.users().messages().list(**kwargs).execute(http=self.http)
         
         except HttpError as error:
             raise AirbyteTracedException(
@@ -128,14 +284,26 @@ class GmailClient:
                 failure_type=FailureType.system_error,
             )
 
-    def get_message(self, message_id: str) -> Dict[str, Any]:
+    def _get_message_request(self, message_id: str, format: str, metadata_headers: Optional[List[str]]):
+        """Build a messages.get request for the given format."""
+        kwargs = {
+            'userId': 'me',
+            'id': message_id,
+            'format': format,
+        }
+        
+        if format == 'metadata':
+            kwargs['metadataHeaders'] = metadata_headers or METADATA_HEADERS
+        
+        if format in MESSAGE_FIELDS:
+            kwargs['fields'] = MESSAGE_FIELDS[format]
+        
+        return self.service.users().messages().get(**kwargs)
+
+    def get_message(self, message_id: str, format: str = 'full', metadata_headers: Optional[List[str]] = None) -> Dict[str, Any]:
         """Get a single message by ID."""
         try:
-            return self.service.users().messages().get(
-                userId='me',
-                id=message_id,
-                format='full'
-            ).execute()
+            return self._get_message_request(message_id, format, metadata_headers).execute(http=self.http)
         except HttpError as error:
             raise AirbyteTracedException(
                 internal_message=f"Failed to get message {message_id}: {error}",
@@ -143,6 +311,103 @@ class GmailClient:
                 failure_type=FailureType.system_error,
             )
 
+    def get_messages_batch(
+        self,
+        ids: List[str],
+        format: str = 'full',
+        metadata_headers: Optional[List[str]] = None,
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, HttpError]]:
+        """Get multiple messages by ID using the Gmail batch endpoint.
+
+        Returns the retrieved messages and, for every id that no longer exists
+        (404, e.g. deleted since it was listed), its error. Any other failure,
+        including retryable ones that outlast every attempt, fails the sync so
+        no message is silently skipped.
+        """
+        messages = {}
+        errors = {}
+
+        for start in range(0, len(ids), BATCH_SIZE):
+            pending = ids[start:start + BATCH_SIZE]
+            try:
+                self._execute_batch(pending, messages, errors, format, metadata_headers)
+            except RetryableBatchError as error:
+                raise AirbyteTracedException(
+                    internal_message=f"Giving up on {len(pending)} messages after {MAX_RETRY_ATTEMPTS} attempts: {error}",
+                    message="Gmail kept throttling or failing message requests. Please try the sync again later.",
+                    failure_type=FailureType.transient_error,
+                )
+
+        return messages, errors
+
+    @retry(
+        retry=retry_if_exception_type(RetryableBatchError),
+        wait=wait_random_exponential(multiplier=1, max=MAX_RETRY_WAIT),
+        stop=stop_after_attempt(MAX_RETRY_ATTEMPTS),
+        reraise=True,
+    )
+    def _execute_batch(
+        self,
+        pending: List[str],
+        messages: Dict[str, Dict[str, Any]],
+        errors: Dict[str, HttpError],
+        format: str,
+        metadata_headers: Optional[List[str]],
+    ) -> None:
+        """Execute one batch of message requests.
+
+        Successful responses are stored in `messages` and missing messages in
+        `errors`. `pending` is narrowed to the ids that failed with a retryable
+        status, so a retry only resends those.
+        """
+        retryable = []
+        failed = {}
+
+        def callback(request_id: str, response: Dict[str, Any], exception: Optional[HttpError]):
+            if exception is None:
+                messages[request_id] = response
+                errors.pop(request_id, None)
+            elif _is_retryable(exception):
+                errors[request_id] = exception
+                retryable.append(request_id)
+            elif getattr(exception.resp, 'status', None) == 404:
+                errors[request_id] = exception
+            else:
+                failed[request_id] = exception
+
+        batch = self.service.new_batch_http_request()
+        for message_id in pending:
+            batch.add(
+                self._get_message_request(message_id, format, metadata_headers),
+                request_id=message_id,
+                callback=callback,
+            )
+        self._quota.acquire(len(pending) * MESSAGE_GET_QUOTA_UNITS)
+        try:
+            batch.execute(http=self.http)
+        except HttpError as error:
+            if _is_retryable(error):
+                for message_id in pending:
+                    errors[message_id] = error
+                raise RetryableBatchError(f"Message batch failed with status {error.resp.status}")
+            raise AirbyteTracedException(
+                internal_message=f"Failed to get message batch: {error}",
+                message="Failed to retrieve Gmail messages.",
+                failure_type=FailureType.system_error,
+            )
+
+        if failed:
+            message_id, error = next(iter(failed.items()))
+            raise AirbyteTracedException(
+                internal_message=f"Failed to get {len(failed)} messages, first {message_id}: {error}",
+                message="Failed to retrieve Gmail messages.",
+                failure_type=FailureType.system_error,
+            )
+
+        pending[:] = retryable
+        if pending:
+            raise RetryableBatchError(f"{len(pending)} messages failed with a retryable status")
+
     def get_attachment(self, message_id: str, attachment_id: str) -> Dict[str, Any]:
         """Get an attachment from a message."""
         try:
@@ -150,7 +415,7 @@ class GmailClient:
                 userId='me',
                 messageId=message_id,
                 id=attachment_id
-            ).execute()
+            ).execute(http=self.http)
         except HttpError as error:
             raise AirbyteTracedException(
                 internal_message=f"Failed to get attachment {attachment_id}: {error}",
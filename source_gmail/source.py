@@ -23,8 +23,9 @@ class SourceGmail(AbstractSource):
             client = GmailClient(spec)
             
             # Try to connect and get user profile
-            if client.check_connection():
-                email = client.get_user_email()
+            profile = client.get_profile()
+            if profile:
+                email = profile.get('emailAddress', 'unknown')
                 return True, f"Successfully connected to Gmail account: {email}"
             else:
                 return False, "Failed to connect to Gmail API"
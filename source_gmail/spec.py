@@ -56,4 +56,11 @@ class SourceGmailSpec(BaseModel):
         pattern="^[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]{6}Z$",
         examples=["2024-01-01T00:00:00.000000Z", "2024-06-15T12:30:45.000000Z"],
         order=40,
+    )
+
+    include_bodies: bool = Field(
+        default=True,
+        title="Include Message Bodies",
+        description="Download message bodies and attachment metadata. Disable to fetch only headers and snippets, which is considerably faster.",
+        order=50,
     )
\ No newline at end of file
@@ -3,13 +3,97 @@
 #
 
 import base64
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Mapping, Optional
+from queue import Full, Queue
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from googleapiclient.errors import HttpError
 
 from airbyte_cdk.models import SyncMode
 from airbyte_cdk.sources.streams import Stream
-from source_gmail.client import GmailClient
-from source_gmail.utils import parse_message_headers, parse_message_parts, sanitize_text
+from source_gmail.client import BATCH_SIZE, MAX_CONCURRENT_BATCHES, GmailClient
+from source_gmail.utils import parse_many_headers, parse_message_parts, sanitize_text
+
+
+# Number of fetched message batches buffered between the producer thread and the record generator
+PREFETCH_BATCHES = 2
+
+# Seconds between checks for a stopped consumer while the queue is full
+QUEUE_POLL_INTERVAL = 0.5
+
+# Only every Nth message that could not be retrieved is logged
+ERROR_LOG_INTERVAL = 100
+
+# Record fields derived from the message's MIME parts
+BODY_FIELDS = frozenset({"body_plain", "attachments"})
+
+# Marks the end of the producer's output
+_SENTINEL = object()
+
+# Schemas are built once at import time; MappingProxyType guards against accidental mutation
+_MESSAGES_SCHEMA = MappingProxyType({
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "type": "object",
+    "properties": {
+        "id": {"type": "string"},
+        "thread_id": {"type": "string"},
+        "label_ids": {
+            "type": ["null", "array"],
+            "items": {"type": "string"}
+        },
+        "from": {"type": ["null", "string"]},
+        "to": {"type": ["null", "string"]},
+        "cc": {"type": ["null", "string"]},
+        "bcc": {"type": ["null", "string"]},
+        "subject": {"type": ["null", "string"]},
+        "date": {"type": ["null", "string"]},
+        "internal_date": {"type": ["null", "string"], "format": "date-time"},
+        "snippet": {"type": ["null", "string"]},
+        "body_plain": {"type": ["null", "string"]},
+        # "body_html": {"type": ["null", "string"]},
+        "attachments": {
+            "type": ["null", "array"],
+            "items": {
+                "type": "object",
+                "properties": {
+                    "filename": {"type": ["null", "string"]},
+                    "mime_type": {"type": ["null", "string"]},
+                    "size": {"type": ["null", "integer"]},
+                    "attachment_id": {"type": ["null", "string"]}
+                }
+            }
+        },
+        "size_estimate": {"type": ["null", "integer"]},
+        "history_id": {"type": ["null", "string"]},
+        "raw": {"type": ["null", "string"]}
+    },
+    "additionalProperties": True
+})
+
+_LABELS_SCHEMA = MappingProxyType({
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "type": "object",
+    "properties": {
+        "id": {"type": "string"},
+        "name": {"type": "string"},
+        "type": {"type": ["null", "string"]},
+        "messages_total": {"type": ["null", "integer"]},
+        "messages_unread": {"type": ["null", "integer"]},
+        "threads_total": {"type": ["null", "integer"]},
+        "threads_unread": {"type": ["null", "integer"]},
+        "color": {
+            "type": ["null", "object"],
+            "properties": {
+                "text_color": {"type": ["null", "string"]},
+                "background_color": {"type": ["null", "string"]}
+            }
+        }
+    },
+    "additionalProperties": True
+})
 
 
 class GmailMessagesStream(Stream):
@@ -24,6 +108,10 @@ class GmailMessagesStream(Stream):
         super().__init__(**kwargs)
         self.client = client
         self.config = config
+        # Raw internalDate milliseconds of emitted records, keyed by record id, so state
+        # updates can compare integers instead of re-parsing the ISO cursor value
+        self._cursor_ms: Dict[str, int] = {}
+        self._error_count = 0
 
     @property
     def name(self) -> str:
@@ -33,44 +121,7 @@ class GmailMessagesStream(Stream):
         """
         Get the JSON schema for Gmail messages.
         """
-        return {
-            "$schema": "http://json-schema.org/draft-07/schema#",
-            "type": "object",
-            "properties": {
-                "id": {"type": "string"},
-                "thread_id": {"type": "string"},
-                "label_ids": {
-                    "type": ["null", "array"],
-                    "items": {"type": "string"}
-                },
-                "from": {"type": ["null", "string"]},
-                "to": {"type": ["null", "string"]},
-                "cc": {"type": ["null", "string"]},
-                "bcc": {"type": ["null", "string"]},
-                "subject": {"type": ["null", "string"]},
-                "date": {"type": ["null", "string"]},
-                "internal_date": {"type": ["null", "string"], "format": "date-time"},
-                "snippet": {"type": ["null", "string"]},
-                "body_plain": {"type": ["null", "string"]},
-                # "body_html": {"type": ["null", "string"]},
-                "attachments": {
-                    "type": ["null", "array"],
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "filename": {"type": ["null", "string"]},
-                            "mime_type": {"type": ["null", "string"]},
-                            "size": {"type": ["null", "integer"]},
-                            "attachment_id": {"type": ["null", "string"]}
-                        }
-                    }
-                },
-                "size_estimate": {"type": ["null", "integer"]},
-                "history_id": {"type": ["null", "string"]},
-                "raw": {"type": ["null", "string"]}
-            },
-            "additionalProperties": True
-        }
+        return _MESSAGES_SCHEMA
 
     def read_records(
         self,
@@ -82,84 +133,244 @@ class GmailMessagesStream(Stream):
         """
         Read Gmail messages.
         """
-        page_token = None
+        query = self.config.get("query", "")
+        last_sync_ms = None
         
         # For incremental sync, check if we have a state
         if sync_mode == SyncMode.incremental and stream_state and self.cursor_field in stream_state:
             # Get the last sync timestamp
-            last_sync_ms = stream_state[self.cursor_field]
-            # Convert to seconds and create a date filter
-            last_sync_date = datetime.fromtimestamp(int(last_sync_ms) / 1000, tz=timezone.utc)
-            # Format date for Gmail query (YYYY/MM/DD)
-            date_filter = f"after:{last_sync_date.year}/{last_sync_date.month}/{last_sync_date.day}"
+            last_sync_ms = int(stream_state[self.cursor_field])
+            # Gmail accepts epoch seconds in after:, which is far finer than a YYYY/MM/DD date.
+            # Step back one second so messages sharing the cursor's second are not missed;
+            # anything older than the cursor is dropped client-side below.
+            date_filter = f"after:{last_sync_ms // 1000 - 1}"
             
             # Add to existing query
-            existing_query = self.config.get("query", "")
-            if existing_query:
-                query = f"{existing_query} {date_filter}"
+            if query:
+                query = f"{query} {date_filter}"
             else:
                 query = date_filter
-            
-        else:
-            query = self.config.get("query", "")
         
-        while True:
-            # List messages
-            response = self.client.list_messages(
-                query=query,
-                label_ids=self.config.get("labels"),
-                page_token=page_token
-            )
-            
-            messages = response.get("messages", [])
-            
-            # Fetch full message details for each message
-            for msg_ref in messages:
-                try:
-                    # Get full message
-                    message = self.client.get_message(msg_ref["id"])
-                    
-                    # Parse message data
-                    headers = parse_message_headers(message.get("payload", {}).get("headers", []))
-                    body_plain, body_html, attachments = parse_message_parts(message.get("payload", {}))
+        # Config lookups are bound once rather than repeated per page or per message
+        label_ids = self.config.get("labels")
+        include_raw = self.config.get("include_raw", False)
+        
+        # Only download and parse message bodies when they will be emitted. Bodies and
+        # attachments both come from the MIME parts, so skip them unless one is selected
+        # in the configured catalog (set by the CDK before records are read).
+        selected_fields = (self.configured_json_schema or {}).get("properties")
+        needs_body = not selected_fields or not BODY_FIELDS.isdisjoint(selected_fields)
+        include_bodies = self.config.get("include_bodies", True) and needs_body
+        message_format = "full" if include_bodies else "metadata"
+        
+        # Gmail I/O runs in a producer thread so it overlaps with record parsing and emission here
+        queue: Queue = Queue(maxsize=PREFETCH_BATCHES)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce_messages,
+            args=(queue, stop, query, label_ids, message_format),
+            daemon=True,
+        )
+        producer.start()
+        
+        try:
+            while True:
+                batch = queue.get()
+                if batch is _SENTINEL:
+                    break
+                if isinstance(batch, BaseException):
+                    raise batch
+                
+                pending = []
+                for message_id, message, error in batch:
+                    if message is None:
+                        # The client only returns no message for ids that no longer exist;
+                        # any other failure has already failed the sync. Log the first skip
+                        # and every hundredth after it, so a burst does not flood the log.
+                        self._error_count += 1
+                        if self._error_count % ERROR_LOG_INTERVAL == 1:
+                            if error is not None:
+                                reason = f"HTTP {error.resp.status} {error.reason}"
+                            else:
+                                reason = "no response returned"
+                            self.logger.warning(
+                                f"Skipping message {message_id}, which may have been deleted: {reason} "
+                                f"({self._error_count} messages skipped so far)"
+                            )
+                        continue
                     
-                    # Convert internal date to datetime with RFC 3339 format
+                    # Skip messages already synced, before doing any parsing work
                     internal_date_ms = int(message.get("internalDate", 0))
-                    internal_date = datetime.fromtimestamp(internal_date_ms / 1000, tz=timezone.utc).isoformat()
-                    
-                    record = {
-                        "id": message["id"],
-                        "thread_id": message.get("threadId"),
-                        "label_ids": message.get("labelIds", []),
-                        "from": headers.get("from"),
-                        "to": headers.get("to"),
-                        "cc": headers.get("cc"),
-                        "bcc": headers.get("bcc"),
-                        "subject": headers.get("subject"),
-                        "date": headers.get("date"),
-                        "internal_date": internal_date,
-                        "snippet": message.get("snippet"),
-                        "body_plain": sanitize_text(body_plain),
-                        # "body_html": body_html,
-                        "attachments": attachments,
-                        "size_estimate": message.get("sizeEstimate"),
-                        "history_id": message.get("historyId"),
-                    }
-                    
-                    # Optionally include raw message
-                    if self.config.get("include_raw", False):
-                        record["raw"] = message.get("raw")
+                    if last_sync_ms is not None and internal_date_ms < last_sync_ms:
+                        continue
                     
+                    pending.append((message, internal_date_ms))
+                
+                # Parse the headers of the whole batch in one call
+                batch_headers = parse_many_headers(
+                    message.get("payload", {}).get("headers", []) for message, _ in pending
+                )
+                
+                for (message, internal_date_ms), headers in zip(pending, batch_headers):
+                    record = self._to_record(message, headers, internal_date_ms, include_bodies, include_raw)
+                    self._cursor_ms[record["id"]] = internal_date_ms
                     yield record
-                    
-                except Exception as e:
-                    self.logger.error(f"Error processing message {msg_ref['id']}: {str(e)}")
-                    continue
+        finally:
+            # Unblock the producer if the consumer stopped early or failed
+            stop.set()
+            producer.join()
+    
+    def _produce_messages(
+        self,
+        queue: Queue,
+        stop: threading.Event,
+        query: str,
+        label_ids: Optional[List[str]],
+        message_format: str,
+    ) -> None:
+        """
+        List and fetch messages page by page, putting each fetched batch on the queue.
+        Ends with a sentinel, or with the exception that stopped it.
+        """
+        # Prefetch the next page listing while the current page's messages are being fetched
+        executor = ThreadPoolExecutor(max_workers=1)
+        batch_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_BATCHES)
+        try:
+            response = self._wait(
+                executor.submit(self.client.list_messages, query=query, label_ids=label_ids),
+                stop,
+            )
             
-            # Check for next page
-            page_token = response.get("nextPageToken")
-            if not page_token:
-                break
+            while response is not None:
+                page_token = response.get("nextPageToken")
+                next_page = None
+                if page_token:
+                    next_page = executor.submit(
+                        self.client.list_messages,
+                        query=query,
+                        label_ids=label_ids,
+                        page_token=page_token
+                    )
+                
+                message_ids = [msg_ref["id"] for msg_ref in response.get("messages", [])]
+                
+                for batch in self._fetch_messages(batch_executor, stop, message_ids, message_format):
+                    if not self._put(queue, stop, batch):
+                        return
+                
+                if next_page is None:
+                    self._put(queue, stop, _SENTINEL)
+                    return
+                response = self._wait(next_page, stop)
+        except BaseException as e:
+            self._put(queue, stop, e)
+        finally:
+            # Do not wait for in-flight batches, retry backoff included, once nothing
+            # will consume them; work that has not started yet is dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+            batch_executor.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    def _wait(future: Future, stop: threading.Event) -> Any:
+        """
+        Wait for a future's result, giving up with None once the consumer has stopped.
+        """
+        while not stop.is_set():
+            done, _ = wait([future], timeout=QUEUE_POLL_INTERVAL)
+            if done:
+                return future.result()
+        return None
+    
+    @staticmethod
+    def _put(queue: Queue, stop: threading.Event, item: Any) -> bool:
+        """
+        Put an item on the queue, giving up once the consumer has stopped.
+        """
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=QUEUE_POLL_INTERVAL)
+                return True
+            except Full:
+                continue
+        return False
+    
+    def _to_record(
+        self,
+        message: Mapping[str, Any],
+        headers: Mapping[str, str],
+        internal_date_ms: int,
+        include_bodies: bool,
+        include_raw: bool,
+    ) -> Dict[str, Any]:
+        """
+        Convert a Gmail API message into a stream record.
+        """
+        # Parse message data
+        payload = message.get("payload", {})
+        if include_bodies:
+            body_plain, body_html, attachments = parse_message_parts(payload)
+        else:
+            body_plain, body_html, attachments = None, None, []
+        
+        # Convert internal date to datetime with RFC 3339 format
+        internal_date = datetime.fromtimestamp(internal_date_ms / 1000, tz=timezone.utc).isoformat()
+        
+        # A single dict display is built in one step from a constant key tuple,
+        # which is cheaper than copying and filling in a template dict
+        header = headers.get
+        record = {
+            "id": message["id"],
+            "thread_id": message.get("threadId"),
+            "label_ids": message.get("labelIds", []),
+            "from": header("from"),
+            "to": header("to"),
+            "cc": header("cc"),
+            "bcc": header("bcc"),
+            "subject": header("subject"),
+            "date": header("date"),
+            "internal_date": internal_date,
+            "snippet": message.get("snippet"),
+            "body_plain": sanitize_text(body_plain),
+            # "body_html": body_html,
+            "attachments": attachments,
+            "size_estimate": message.get("sizeEstimate"),
+            "history_id": message.get("historyId"),
+        }
+        
+        # Optionally include raw message
+        if include_raw:
+            record["raw"] = message.get("raw")
+        
+        return record
+    
+    def _fetch_messages(
+        self,
+        executor: ThreadPoolExecutor,
+        stop: threading.Event,
+        message_ids: List[str],
+        message_format: str,
+    ) -> Iterable[List[Tuple[str, Optional[Dict[str, Any]], Optional[HttpError]]]]:
+        """
+        Fetch message details in concurrent batches, yielding a list of (id, message, error) tuples as each batch completes.
+        Messages that could not be retrieved are paired with None and the error that caused it.
+        """
+        futures = {}
+        for start in range(0, len(message_ids), BATCH_SIZE):
+            if stop.is_set():
+                return
+            chunk = message_ids[start:start + BATCH_SIZE]
+            futures[executor.submit(self.client.get_messages_batch, chunk, message_format)] = chunk
+        
+        # Poll rather than block in as_completed, so a stopped consumer is noticed mid-page
+        not_done = set(futures)
+        while not_done and not stop.is_set():
+            done, not_done = wait(not_done, timeout=QUEUE_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                messages, errors = future.result()
+                yield [
+                    (message_id, messages.get(message_id), errors.get(message_id))
+                    for message_id in futures[future]
+                ]
     
     def get_updated_state(self, current_stream_state: Mapping[str, Any], latest_record: Mapping[str, Any]) -> Mapping[str, Any]:
         """
@@ -168,8 +379,10 @@ class GmailMessagesStream(Stream):
         if not latest_record:
             return current_stream_state
         
-        # Get the cursor value from the latest record
-        latest_cursor_value = latest_record.get(self.cursor_field)
+        # Use the raw millisecond value stashed when the record was emitted, if available
+        latest_cursor_value = self._cursor_ms.pop(latest_record.get("id"), None)
+        if latest_cursor_value is None:
+            latest_cursor_value = latest_record.get(self.cursor_field)
         if not latest_cursor_value:
             return current_stream_state
         
@@ -205,27 +418,7 @@ class GmailLabelsStream(Stream):
         """
         Get the JSON schema for Gmail labels.
         """
-        return {
-            "$schema": "http://json-schema.org/draft-07/schema#",
-            "type": "object",
-            "properties": {
-                "id": {"type": "string"},
-                "name": {"type": "string"},
-                "type": {"type": ["null", "string"]},
-                "messages_total": {"type": ["null", "integer"]},
-                "messages_unread": {"type": ["null", "integer"]},
-                "threads_total": {"type": ["null", "integer"]},
-                "threads_unread": {"type": ["null", "integer"]},
-                "color": {
-                    "type": ["null", "object"],
-                    "properties": {
-                        "text_color": {"type": ["null", "string"]},
-                        "background_color": {"type": ["null", "string"]}
-                    }
-                }
-            },
-            "additionalProperties": True
-        }
+        return _LABELS_SCHEMA
 
     def read_records(
         self,
@@ -2,25 +2,90 @@
 # Copyright (c) 2025 Airbyte, Inc., all rights reserved.
 #
 
-import base64
 import re
-from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    # SIMD-accelerated decoder, much faster on large message bodies
+    from pybase64 import urlsafe_b64decode as _b64decode
+except ImportError:
+    from base64 import urlsafe_b64decode as _b64decode
+
+# Zero-padded millisecond strings, precomputed for convert_to_rfc3339
+_MS_STR = [f"{ms:03d}" for ms in range(1000)]
+
+# Shared stand-in for a missing part body, so lookups do not allocate a new dict
+_EMPTY_BODY = MappingProxyType({})
+
+# Common headers kept by parse_message_headers, mapped from lowercased name to record key
+_HEADER_MAP = {
+    "from": "from",
+    "to": "to",
+    "cc": "cc",
+    "bcc": "bcc",
+    "subject": "subject",
+    "date": "date",
+    "message-id": "message_id",
+    "reply-to": "reply_to",
+}
+
+# Single-character cleanups applied by sanitize_text in one str.translate pass.
+# Further characters to delete or replace belong here rather than in a regex class.
+_TRANSLATE_TABLE = str.maketrans({
+    '\r': None,
+    '\t': ' ',
+    '\u200b': None,
+    '\u200c': None,
+    '\u200d': None,
+    '\ufeff': None,
+    '\u00ad': None,
+})
+
+# Patterns used by sanitize_text, compiled once at import time
+_MULTI_SPACE_RE = re.compile(r' {2,}')
+_UTM_RE = re.compile(r'[?&]utm_[^)\s]*')
+_PAREN_URL_RE = re.compile(r'\(\s*(https?://[^\s)]+)\s*\)')
+_SPACES_RE = re.compile(r' +')
 
 
 def parse_message_headers(headers: List[Dict[str, str]]) -> Dict[str, str]:
     """
     Parse message headers into a dictionary.
     """
-    header_dict = {}
-    for header in headers:
-        name = header.get("name", "").lower()
-        value = header.get("value", "")
-        
-        # Store common headers
-        if name in ["from", "to", "cc", "bcc", "subject", "date", "message-id", "reply-to"]:
-            header_dict[name.replace("-", "_")] = value
-    
-    return header_dict
+    # Store common headers
+    return {
+        key: header.get("value", "")
+        for header in headers
+        if (key := _HEADER_MAP.get(header.get("name", "").lower())) is not None
+    }
+
+
+def parse_many_headers(messages_headers: Iterable[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+    """
+    Parse the headers of many messages at once, returning one dictionary per message.
+    """
+    # Bind the lookup once for the whole batch
+    header_key = _HEADER_MAP.get
+    return [
+        {
+            key: header.get("value", "")
+            for header in headers
+            if (key := header_key(header.get("name", "").lower())) is not None
+        }
+        for headers in messages_headers
+    ]
+
+
+def _decode_body(data: str) -> str:
+    """
+    Decode a base64url message body to text, taking the cheaper ASCII codec when the bytes allow it.
+    """
+    raw = _b64decode(data)
+    if raw.isascii():
+        return raw.decode("ascii")
+    return raw.decode("utf-8", errors="ignore")
 
 
 def parse_message_parts(payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], List[Dict[str, Any]]]:
@@ -32,16 +97,27 @@ def parse_message_parts(payload: Dict[str, Any]) -> Tuple[Optional[str], Optiona
     html_text = None
     attachments = []
     
-    def process_part(part: Dict[str, Any]):
-        nonlocal plain_text, html_text, attachments
-        
+    # Walk the MIME tree depth-first with an explicit stack. Children are pushed
+    # in reverse so parts are visited in document order.
+    if "parts" in payload:
+        stack = list(reversed(payload["parts"]))
+    else:
+        # Single part message
+        stack = [payload]
+    
+    while stack:
+        part = stack.pop()
         mime_type = part.get("mimeType", "")
-        body = part.get("body", {})
+        
+        # Only the branches that use the body look it up, and text is decoded only
+        # when it will be kept, so containers and duplicate text parts cost nothing
         
         # Check if it's an attachment
-        if part.get("filename"):
+        filename = part.get("filename")
+        if filename:
+            body = part.get("body") or _EMPTY_BODY
             attachment = {
-                "filename": part["filename"],
+                "filename": filename,
                 "mime_type": mime_type,
                 "size": body.get("size", 0),
                 "attachment_id": body.get("attachmentId")
@@ -50,38 +126,36 @@ def parse_message_parts(payload: Dict[str, Any]) -> Tuple[Optional[str], Optiona
         
         # Process text content
         elif mime_type == "text/plain" and plain_text is None:
-            data = body.get("data", "")
+            data = (part.get("body") or _EMPTY_BODY).get("data")
             if data:
-                plain_text = base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+                plain_text = _decode_body(data)
         
         elif mime_type == "text/html" and html_text is None:
-            data = body.get("data", "")
+            data = (part.get("body") or _EMPTY_BODY).get("data")
             if data:
-                html_text = base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+                html_text = _decode_body(data)
         
         # Process multipart
         if "parts" in part:
-            for subpart in part["parts"]:
-                process_part(subpart)
-    
-    # Start processing from the root payload
-    if "parts" in payload:
-        for part in payload["parts"]:
-            process_part(part)
-    else:
-        # Single part message
-        process_part(payload)
+            if plain_text is not None and html_text is not None:
+                # Only attachments can still be found, so skip leaf parts without a filename
+                stack.extend(
+                    subpart for subpart in reversed(part["parts"])
+                    if subpart.get("filename") or "parts" in subpart
+                )
+            else:
+                stack.extend(reversed(part["parts"]))
     
     return plain_text, html_text, attachments
 
 
 def convert_to_rfc3339(timestamp_ms: int) -> str:
     """
-    Convert millisecond timestamp to RFC3339 format.
+    Convert millisecond timestamp to RFC3339 format in UTC.
     """
-    from datetime import datetime
-    dt = datetime.fromtimestamp(timestamp_ms / 1000)
-    return dt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    seconds, ms = divmod(int(timestamp_ms), 1000)
+    dt = datetime.fromtimestamp(seconds, tz=timezone.utc)
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}T{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}.{_MS_STR[ms]}Z"
 
 
 def sanitize_text(text: Optional[str]) -> Optional[str]:
@@ -91,44 +165,33 @@ def sanitize_text(text: Optional[str]) -> Optional[str]:
     if not text:
         return text
     
-    # Remove carriage returns
-    text = text.replace('\r', '')
-    
-    # Remove tabs and replace with single space
-    text = text.replace('\t', ' ')
+    # Remove carriage returns, replace tabs with a single space and remove
+    # zero-width spaces and other invisible characters, all in one pass
+    text = text.translate(_TRANSLATE_TABLE)
     
-    # Remove zero-width spaces and other invisible characters
-    text = re.sub(r'[\u200b\u200c\u200d\ufeff\u00ad]', '', text)
+    # Fast path for short, clean bodies: without these substrings none of the
+    # patterns below can match, so only the outer whitespace needs trimming
+    if '\n' not in text and '  ' not in text and 'utm_' not in text and '(' not in text:
+        return text.strip()
     
     # Remove excessive spaces (more than 2 consecutive)
-    text = re.sub(r' {2,}', ' ', text)
-    
-    # Split into lines and process each
-    lines = text.split('\n')
+    text = _MULTI_SPACE_RE.sub(' ', text)
     
     # Remove leading/trailing whitespace from each line and filter empty lines
-    processed_lines = []
-    for line in lines:
-        line = line.strip()
-        if line:  # Only keep non-empty lines
-            processed_lines.append(line)
-    
-    # Join lines back together
-    text = '\n'.join(processed_lines)
-    
-    # Add paragraph breaks where there are multiple consecutive line breaks
-    text = re.sub(r'\n{2,}', '\n\n', text)
+    text = '\n'.join([stripped for line in text.split('\n') if (stripped := line.strip())])
     
     # Clean up URLs - remove tracking parameters and clean up formatting
     # This regex finds URLs and removes common tracking parameters
-    text = re.sub(r'\?utm_[^)\s]*', '', text)
-    text = re.sub(r'&utm_[^)\s]*', '', text)
+    if 'utm_' in text:
+        text = _UTM_RE.sub('', text)
     
     # Remove parentheses around URLs if they're standalone
-    text = re.sub(r'\(\s*(https?://[^\s)]+)\s*\)', r' \1', text)
+    if '(' in text:
+        text = _PAREN_URL_RE.sub(r' \1', text)
     
     # Final cleanup - remove any remaining multiple spaces
-    text = re.sub(r' +', ' ', text)
+    if '  ' in text:
+        text = _SPACES_RE.sub(' ', text)
     
     # Remove empty lines at the beginning and end
     text = text.strip()
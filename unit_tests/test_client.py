@@ -0,0 +1,213 @@
+#
+# Copyright (c) 2025 Airbyte, Inc., all rights reserved.
+#
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import httplib2
+import pytest
+from airbyte_cdk import AirbyteTracedException, FailureType
+from googleapiclient.errors import BatchError, HttpError
+from source_gmail.client import BATCH_SIZE, MESSAGE_GET_QUOTA_UNITS, GmailClient, QuotaRateLimiter
+from source_gmail.spec import SourceGmailSpec
+from tenacity import wait_none
+
+
+def _http_error(status, reason=None):
+    content = b""
+    if reason:
+        content = json.dumps({"error": {"code": status, "message": reason, "errors": [{"reason": reason}]}}).encode()
+    return HttpError(httplib2.Response({"status": status}), content, uri="https://gmail.googleapis.com/batch")
+
+
+class FakeBatch:
+    """Batch request that answers each call from a per-attempt outcome table."""
+    
+    def __init__(self, outcomes, sent):
+        self._outcomes = outcomes
+        self._sent = sent
+        self._calls = []
+    
+    def add(self, request, request_id, callback):
+        self._calls.append((request_id, callback))
+    
+    def execute(self, http=None):
+        self._sent.append([request_id for request_id, _ in self._calls])
+        for request_id, callback in self._calls:
+            outcome = self._outcomes.get(request_id, [200]).pop(0)
+            if outcome == 200:
+                callback(request_id, {"id": request_id}, None)
+            elif isinstance(outcome, HttpError):
+                callback(request_id, None, outcome)
+            else:
+                callback(request_id, None, _http_error(outcome))
+
+
+class FakeCredentials:
+    """Credentials whose refresh blocks until released, and optionally fails."""
+    
+    def __init__(self, expiry):
+        self.expiry = expiry
+        self.refreshes = 0
+        self.release = threading.Event()
+        self.fail = False
+    
+    def refresh(self, request):
+        self.refreshes += 1
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("refresh failed")
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+
+def _client():
+    return GmailClient(SourceGmailSpec(client_id="id", client_secret="secret", refresh_token="token"))
+
+
+@pytest.fixture
+def client(mocker):
+    mocker.patch.object(GmailClient._execute_batch.retry, "wait", wait_none())
+    client = _client()
+    client._credentials = mocker.Mock(expiry=None)
+    client._local.http = mocker.Mock()
+    client._service = mocker.Mock()
+    client._quota = mocker.Mock()
+    return client
+
+
+def _serve(client, outcomes):
+    sent = []
+    client._service.new_batch_http_request.side_effect = lambda: FakeBatch(outcomes, sent)
+    return sent
+
+
+def test_quota_limiter_paces_to_units_per_second(mocker):
+    clock = mocker.patch("source_gmail.client.time.monotonic", return_value=0.0)
+    sleep = mocker.patch("source_gmail.client.time.sleep")
+    limiter = QuotaRateLimiter(250)
+    
+    # The first second's budget is available up front, then callers queue behind each other
+    limiter.acquire(250)
+    sleep.assert_not_called()
+    limiter.acquire(250)
+    sleep.assert_called_with(1.0)
+    limiter.acquire(125)
+    sleep.assert_called_with(1.5)
+    
+    # Once the debt is paid back, units accrue again up to the burst capacity
+    clock.return_value = 100.0
+    sleep.reset_mock()
+    limiter.acquire(250)
+    sleep.assert_not_called()
+
+
+def test_batches_spend_quota_per_message(client):
+    _serve(client, {})
+    ids = [f"m{i}" for i in range(BATCH_SIZE + 1)]
+    
+    client.get_messages_batch(ids)
+    
+    assert [c.args[0] for c in client._quota.acquire.call_args_list] == [
+        BATCH_SIZE * MESSAGE_GET_QUOTA_UNITS,
+        MESSAGE_GET_QUOTA_UNITS,
+    ]
+
+
+def test_token_refresh_is_scheduled_once_while_in_flight(mocker):
+    mocker.patch("source_gmail.client.Request")
+    client = _client()
+    # google-auth keeps expiry as naive UTC; this one is inside the refresh margin
+    credentials = FakeCredentials(datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(minutes=1))
+    client._credentials = credentials
+    
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: client.http, range(16)))
+    assert credentials.refreshes == 1
+    
+    credentials.release.set()
+    client._refresh_future.result()
+    client.http
+    assert credentials.refreshes == 1
+
+
+def test_token_refresh_is_rescheduled_after_failure(mocker):
+    mocker.patch("source_gmail.client.Request")
+    client = _client()
+    credentials = FakeCredentials(datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(minutes=1))
+    credentials.fail = True
+    credentials.release.set()
+    client._credentials = credentials
+    
+    client.http
+    with pytest.raises(RuntimeError):
+        client._refresh_future.result()
+    
+    credentials.fail = False
+    client.http
+    client._refresh_future.result()
+    assert credentials.refreshes == 2
+
+
+def test_token_not_refreshed_far_from_expiry(mocker):
+    mocker.patch("source_gmail.client.Request")
+    client = _client()
+    credentials = FakeCredentials(datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(minutes=30))
+    client._credentials = credentials
+    
+    client.http
+    
+    assert credentials.refreshes == 0
+    assert client._refresh_future is None
+
+
+def test_batch_retry_resends_only_retryable_ids(client):
+    sent = _serve(client, {"b": [429, 200], "c": [404], "d": [503, 500, 200]})
+    
+    messages, errors = client.get_messages_batch(["a", "b", "c", "d"])
+    
+    assert sent == [["a", "b", "c", "d"], ["b", "d"], ["d"]]
+    assert set(messages) == {"a", "b", "d"}
+    assert set(errors) == {"c"}
+    assert errors["c"].resp.status == 404
+
+
+def test_batch_retries_403_rate_limit(client):
+    sent = _serve(client, {"a": [_http_error(403, "userRateLimitExceeded"), 200]})
+    
+    messages, errors = client.get_messages_batch(["a"])
+    
+    assert sent == [["a"], ["a"]]
+    assert set(messages) == {"a"}
+    assert errors == {}
+
+
+def test_batch_fails_sync_on_other_errors(client):
+    _serve(client, {"a": [_http_error(403, "insufficientPermissions")]})
+    
+    with pytest.raises(AirbyteTracedException) as error:
+        client.get_messages_batch(["a", "b"])
+    
+    assert error.value.failure_type == FailureType.system_error
+
+
+def test_batch_fails_sync_when_retries_run_out(client):
+    sent = _serve(client, {"a": [429] * 5})
+    
+    with pytest.raises(AirbyteTracedException) as error:
+        client.get_messages_batch(["a", "b"])
+    
+    assert len(sent) == 5
+    assert error.value.failure_type == FailureType.transient_error
+
+
+def test_batch_error_without_response(client):
+    batch = client._service.new_batch_http_request.return_value
+    batch.execute.side_effect = BatchError("Invalid response")
+    
+    with pytest.raises(AirbyteTracedException) as error:
+        client.get_messages_batch(["a"])
+    
+    assert error.value.failure_type == FailureType.system_error
@@ -0,0 +1,135 @@
+#
+# Copyright (c) 2025 Airbyte, Inc., all rights reserved.
+#
+
+import threading
+import time
+
+import httplib2
+import pytest
+from airbyte_cdk.models import SyncMode
+from googleapiclient.errors import HttpError
+from source_gmail.streams import GmailMessagesStream
+
+
+def _message(message_id, internal_date_ms):
+    return {
+        "id": message_id,
+        "threadId": f"thread-{message_id}",
+        "internalDate": str(internal_date_ms),
+        "payload": {"headers": [{"name": "Subject", "value": f"subject {message_id}"}]},
+    }
+
+
+def _fetch(messages, errors=None):
+    """Serve get_messages_batch from dicts of messages and errors, keyed by id."""
+    errors = errors or {}
+    
+    def get_messages_batch(ids, format="full", metadata_headers=None):
+        return (
+            {message_id: messages[message_id] for message_id in ids if message_id in messages},
+            {message_id: errors[message_id] for message_id in ids if message_id in errors},
+        )
+    return get_messages_batch
+
+
+@pytest.fixture
+def client(mocker):
+    return mocker.Mock()
+
+
+def test_incremental_query_and_cursor_filter(client):
+    client.list_messages.return_value = {"messages": [{"id": "old"}, {"id": "same"}, {"id": "new"}]}
+    client.get_messages_batch.side_effect = _fetch({
+        "old": _message("old", 1_700_000_000_499),
+        "same": _message("same", 1_700_000_000_500),
+        "new": _message("new", 1_700_000_001_000),
+    })
+    stream = GmailMessagesStream(client=client, config={"query": "from:someone"})
+    
+    records = list(stream.read_records(
+        sync_mode=SyncMode.incremental,
+        stream_state={"internal_date": 1_700_000_000_500},
+    ))
+    
+    client.list_messages.assert_called_once_with(query="from:someone after:1699999999", label_ids=None)
+    assert [record["id"] for record in records] == ["same", "new"]
+
+
+def test_updated_state_uses_stashed_cursor(client):
+    client.list_messages.return_value = {"messages": [{"id": "a"}, {"id": "b"}, {"id": "c"}]}
+    client.get_messages_batch.side_effect = _fetch({
+        "a": _message("a", 1_700_000_000_123),
+        "b": _message("b", 1_700_000_002_456),
+        "c": _message("c", 1_700_000_001_789),
+    })
+    stream = GmailMessagesStream(client=client, config={})
+    
+    state = {}
+    for record in stream.read_records(sync_mode=SyncMode.incremental, stream_state=state):
+        state = stream.get_updated_state(state, record)
+    
+    # The exact milliseconds are kept, and nothing is left behind once every record is seen
+    assert state == {"internal_date": 1_700_000_002_456}
+    assert stream._cursor_ms == {}
+
+
+def test_producer_exception_is_raised_in_consumer(client):
+    client.list_messages.side_effect = RuntimeError("listing failed")
+    stream = GmailMessagesStream(client=client, config={})
+    
+    with pytest.raises(RuntimeError, match="listing failed"):
+        list(stream.read_records(sync_mode=SyncMode.full_refresh))
+
+
+def test_close_does_not_wait_for_in_flight_batches(client, mocker):
+    mocker.patch("source_gmail.streams.BATCH_SIZE", 1)
+    release = threading.Event()
+    fetch = _fetch({"m1": _message("m1", 1000), "m2": _message("m2", 2000)})
+    
+    def get_messages_batch(ids, format="full", metadata_headers=None):
+        # The second batch hangs, like a batch stuck in retry backoff
+        if ids != ["m1"]:
+            release.wait(10)
+        return fetch(ids, format, metadata_headers)
+    
+    client.list_messages.return_value = {"messages": [{"id": "m1"}, {"id": "m2"}], "nextPageToken": "next"}
+    client.get_messages_batch.side_effect = get_messages_batch
+    stream = GmailMessagesStream(client=client, config={})
+    
+    records = stream.read_records(sync_mode=SyncMode.full_refresh)
+    assert next(records)["id"] == "m1"
+    started = time.monotonic()
+    records.close()
+    elapsed = time.monotonic() - started
+    release.set()
+    
+    assert elapsed < 2
+    # Only the first page and its prefetched successor were ever listed
+    assert client.list_messages.call_count == 2
+
+
+def test_metadata_format_when_no_body_field_selected(client):
+    client.list_messages.return_value = {"messages": [{"id": "m1"}]}
+    client.get_messages_batch.side_effect = _fetch({"m1": _message("m1", 1000)})
+    stream = GmailMessagesStream(client=client, config={})
+    stream.configured_json_schema = {"properties": {"id": {}, "subject": {}}}
+    
+    records = list(stream.read_records(sync_mode=SyncMode.full_refresh))
+    
+    assert client.get_messages_batch.call_args.args[1] == "metadata"
+    assert records[0]["subject"] == "subject m1"
+    assert records[0]["body_plain"] is None
+
+
+def test_deleted_messages_are_skipped(client, caplog):
+    not_found = HttpError(httplib2.Response({"status": 404, "reason": "Not Found"}), b"")
+    client.list_messages.return_value = {"messages": [{"id": "gone"}, {"id": "kept"}]}
+    client.get_messages_batch.side_effect = _fetch({"kept": _message("kept", 1000)}, {"gone": not_found})
+    stream = GmailMessagesStream(client=client, config={})
+    
+    records = list(stream.read_records(sync_mode=SyncMode.full_refresh))
+    
+    assert [record["id"] for record in records] == ["kept"]
+    assert "Skipping message gone" in caplog.text
+    assert "HTTP 404" in caplog.text
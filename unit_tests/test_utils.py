@@ -0,0 +1,139 @@
+#
+# Copyright (c) 2025 Airbyte, Inc., all rights reserved.
+#
+
+import base64
+import time
+
+import pytest
+from source_gmail.utils import (
+    convert_to_rfc3339,
+    parse_many_headers,
+    parse_message_headers,
+    parse_message_parts,
+    sanitize_text,
+)
+
+
+def _text(mime_type, text):
+    return {"mimeType": mime_type, "body": {"data": base64.urlsafe_b64encode(text.encode()).decode()}}
+
+
+def _attachment(filename, attachment_id):
+    return {"mimeType": "application/pdf", "filename": filename, "body": {"attachmentId": attachment_id, "size": 10}}
+
+
+def test_parse_single_part_payload():
+    assert parse_message_parts(_text("text/plain", "hello")) == ("hello", None, [])
+
+
+def test_parse_parts_in_document_order():
+    payload = {
+        "mimeType": "multipart/mixed",
+        "parts": [
+            {
+                "mimeType": "multipart/alternative",
+                "parts": [_text("text/plain", "first plain"), _attachment("a.pdf", "A")],
+            },
+            _text("text/plain", "second plain"),
+            _attachment("b.pdf", "B"),
+            {"mimeType": "multipart/mixed", "parts": [_attachment("c.pdf", "C")]},
+            _text("text/html", "<p>html</p>"),
+        ],
+    }
+    
+    plain, html, attachments = parse_message_parts(payload)
+    
+    # The first text part of each type wins, and attachments keep document order
+    assert plain == "first plain"
+    assert html == "<p>html</p>"
+    assert [attachment["attachment_id"] for attachment in attachments] == ["A", "B", "C"]
+
+
+def test_parse_keeps_deep_attachments_after_both_bodies():
+    payload = {
+        "mimeType": "multipart/mixed",
+        "parts": [
+            {
+                "mimeType": "multipart/alternative",
+                "parts": [_text("text/plain", "plain"), _text("text/html", "html")],
+            },
+            _text("text/plain", "ignored"),
+            {
+                "mimeType": "multipart/mixed",
+                "parts": [
+                    _text("text/html", "ignored"),
+                    {"mimeType": "multipart/mixed", "parts": [_attachment("deep.pdf", "D")]},
+                    _attachment("late.pdf", "L"),
+                ],
+            },
+        ],
+    }
+    
+    plain, html, attachments = parse_message_parts(payload)
+    
+    assert (plain, html) == ("plain", "html")
+    assert attachments == [
+        {"filename": "deep.pdf", "mime_type": "application/pdf", "size": 10, "attachment_id": "D"},
+        {"filename": "late.pdf", "mime_type": "application/pdf", "size": 10, "attachment_id": "L"},
+    ]
+
+
+@pytest.fixture
+def local_zone_far_from_utc(monkeypatch):
+    # Output would shift by hours if local time leaked into the conversion
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.parametrize(
+    "timestamp_ms, expected",
+    [
+        (0, "1970-01-01T00:00:00.000Z"),
+        (1_700_000_000_007, "2023-11-14T22:13:20.007Z"),
+        (1_700_000_000_007.9, "2023-11-14T22:13:20.007Z"),
+    ],
+)
+def test_convert_to_rfc3339_is_utc(local_zone_far_from_utc, timestamp_ms, expected):
+    assert convert_to_rfc3339(timestamp_ms) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("  Hello   world  \n\n\n  bye  \n", "Hello world\nbye"),
+        ("a\r\n \t \r\nb", "a\nb"),
+        ("x" + "\xa0" * 5 + "y\n\xa0\n z", "x" + "\xa0" * 5 + "y\nz"),
+        ("one\u200b\n\n\ntwo", "one\ntwo"),
+    ],
+)
+def test_sanitize_text_line_cleanup(text, expected):
+    assert sanitize_text(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("see https://example.com/page?utm_source=mail&utm_medium=x now", "see https://example.com/page now"),
+        ("see https://example.com/?id=1&utm_campaign=y", "see https://example.com/?id=1"),
+        ("link (https://example.com/a) here", "link https://example.com/a here"),
+        ("link ( https://example.com/b?utm_source=z ) here", "link https://example.com/b here"),
+        ("(" + "&utm_a=1" * 3, "("),
+        ("(http://x.com/a" + "&utm_a=1" * 3, "(http://x.com/a"),
+    ],
+)
+def test_sanitize_text_url_cleanup(text, expected):
+    assert sanitize_text(text) == expected
+
+
+def test_parse_many_headers_matches_single_parse():
+    headers = [
+        [{"name": "From", "value": "a@example.com"}, {"name": "X-Other", "value": "ignored"}],
+        [{"name": "subject", "value": "Hi"}, {"name": "Message-ID", "value": "<1@x>"}],
+        [],
+    ]
+    
+    assert parse_many_headers(headers) == [parse_message_headers(h) for h in headers]